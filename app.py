@@ -1,15 +1,20 @@
 import streamlit as st
 from streamlit_pdf_viewer import pdf_viewer
 from streamlit_ace import st_ace
-import re
-import tempfile
+import os
+import hashlib
 import json
-from docling.document_converter import DocumentConverter
-from pydantic import ValidationError
-from datetime import datetime
-from dateutil.parser import parse
-from weasyprint import HTML, CSS
-
+try:
+    import orjson
+except ImportError:  # orjson is optional, the stdlib json module is used without it
+    orjson = None
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from extraction import ExtractionError, convert_pdf, convert_html, copy_cached_order, init_worker
 
 # Import the Pydantic models
 from models import OrderList, Order, Header, StopInfo, Address, Contact, Vehicle, ActivityEnum, ColorEnum
@@ -17,6 +22,9 @@ from models import OrderList, Order, Header, StopInfo, Address, Contact, Vehicle
 # Constants
 MAX_FILE_SIZE_MB = 25
 MAX_FILE_SIZE_BYTES = MAX_FILE_SIZE_MB * 1024 * 1024
+PROGRESS_UPDATES = 50  # Max progress updates sent to the browser per batch
+ORDER_CACHE_MAX_ENTRIES = 256
+MAX_WORKERS = max(1, (os.cpu_count() or 2) // 2)  # Each worker runs its own Docling models
 
 # Set page to wide mode
 st.set_page_config(page_title="Orders Data", layout="wide")
@@ -24,306 +32,262 @@ st.set_page_config(page_title="Orders Data", layout="wide")
 # Ensure session state is initialized
 if "extracted_orders" not in st.session_state:
     st.session_state.extracted_orders = []
-if "json_viewer_key" not in st.session_state:
-    st.session_state.json_viewer_key = "json_viewer_1"  # Unique key for the st_ace widget
-
-
-def extract_text_from_file(file_path):
-    """Extracts structured data from a PDF/HTML file using Docling's DocumentConverter."""
-    converter = DocumentConverter()
-    result = converter.convert(file_path)
-    
-    extracted_data = {
-        "text": result.document.export_to_markdown(),
-        "dict": result.document.export_to_dict(),
-    }
-    return extracted_data
-
-def extract_value_by_self_ref(json_data, self_ref):
-    """Extracts value dynamically based on self_ref."""
-    for table in json_data.get("tables", []):
-        if table.get("self_ref") == self_ref:
-            return [cell["text"] for cell in table["data"]["table_cells"]]
-    return None
-
-def get_first_non_matching_value(columns, exclude_value):
-    """
-    Returns the first value from a given key in an array of objects that does NOT match the exclude_value.
+if "extracted_digests" not in st.session_state:
+    st.session_state.extracted_digests = set()  # SHA-256 of every PDF already in extracted_orders
+if "html_results" not in st.session_state:
+    st.session_state.html_results = {}  # Conversion result (or ExtractionError) of each uploaded HTML, by SHA-256
+if "formatted_json" not in st.session_state:
+    st.session_state.formatted_json = None  # Serialized extracted_orders, reset whenever they change
 
-    :param columns: List of dictionaries.
-    :param exclude_value: String value to be excluded.
-    :return: The first non-matching string or None if all match/exclude.
-    """
-    for col in columns:
-        if isinstance(col, dict) and "text" in col:  # Ensure col is a dict and contains the key "text"
-            value = col["text"]
-            if isinstance(value, str) and value.strip() and value != exclude_value:
-                return value  # Return the first non-matching value
-    return None  # Return None if all values match exclude_value
-
-def get_first_word(text):
-    """
-    Extracts the first word from a given text safely and ensures it has a valid postal code format.
 
-    :param text: The input string.
-    :return: The first word if it looks like a postal code; otherwise, the original text.
+@st.cache_resource
+def get_executor():
     """
-    if not isinstance(text, str) or not text.strip():
-        return ""  # Return empty string if text is None, empty, or not a string
+    Returns the process pool shared by every rerun, so each worker loads its DocumentConverter only once.
 
-    first_word = text.split()[0]
-
-    # Postal Code Format: Typically 5-digit numbers (can be extended for other formats)
-    if re.fullmatch(r"\d{4,5}", first_word):  
-        return first_word
+    Workers are started from a fresh interpreter (forkserver, or spawn where it is unavailable)
+    rather than forked from the multi-threaded Streamlit server.
+    """
+    start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return ProcessPoolExecutor(
+        max_workers=MAX_WORKERS,
+        mp_context=multiprocessing.get_context(start_method),
+        initializer=init_worker,
+    )
 
-    return text  # Return original input if first word is not a postal code
+def reset_executor(executor):
+    """Drops a broken process pool (e.g. a worker was OOM-killed) so the next call to get_executor starts a new one."""
+    executor.shutdown(wait=False, cancel_futures=True)
+    if get_executor() is executor:  # Another session may already have replaced it
+        get_executor.clear()
 
-def remove_substring_if_found(substring: str | None, main_string: str | None) -> str:
+def submit_to_worker_pool(worker, pending):
     """
-    Removes the given substring from the start of the main string, case-insensitively.
+    Submits each pending file to the shared process pool, starting a new pool once if the cached one is broken.
 
-    :param substring: The string to check and remove (can be None).
-    :param main_string: The string from which the substring should be removed (can be None).
-    :return: The modified main string with the substring removed if found.
+    :return: The executor that ran the files and their futures, in pending order.
     """
-    # Handle None values by converting them to empty strings
-    if substring is None:
-        substring = ""
-    if main_string is None:
-        return ""
-
-    main_string = main_string.strip()
-    substring = substring.strip()
-
-    if main_string.upper().startswith(substring.upper()):
-        return main_string[len(substring) :].lstrip()  # Use lstrip() to remove leftover leading spaces
+    executor = get_executor()
+    try:
+        return executor, [executor.submit(worker, *args) for args in pending]
+    except BrokenProcessPool:
+        # A worker died after the previous batch, so the cached pool refuses new work
+        reset_executor(executor)
+        executor = get_executor()
+        return executor, [executor.submit(worker, *args) for args in pending]
+
+def collect_result(future, file_name):
+    """Returns the result of a worker future, or an ExtractionError if its worker process died."""
+    try:
+        return future.result()
+    except BrokenProcessPool:
+        return ExtractionError(f"Error processing {file_name}: the worker process terminated unexpectedly")
+
+def run_in_worker_pool(worker, pending):
+    """
+    Dispatches each pending file to the shared process pool and returns the results in upload order.
 
-    return main_string
+    Progress is reported in a single collapsed st.status block, updated at most
+    PROGRESS_UPDATES times per batch, instead of one message per file.
 
-def concatenate_text_from_index(objects_list, start_index=11):
+    :param worker: Top-level (picklable) function called as worker(*args).
+    :param pending: List of argument tuples, one per file, whose second item is the file name.
+    :return: List of worker results, one per pending file.
     """
-    Concatenates the 'text' values from a list of objects starting from a given index.
+    if not pending:
+        return []
 
-    :param objects_list: List of dictionaries containing a "text" key.
-    :param start_index: Index from which to start concatenation.
-    :return: Concatenated string of 'text' values.
-    """
-    return "\n".join(obj["text"] for obj in objects_list[start_index:] if "text" in obj and obj["text"].strip())
-
-def format_date(value):
-    """Formats dates into 'DD/MM/YYYY' format."""
-    if value:
-        try:
-            return parse(value).strftime("%d/%m/%Y")
-        except (ValueError, TypeError):
-            return value
-    return value
-
-def build_order_model(data):
-    """Builds a structured OrderList object from extracted PDF data."""
-    
-    # Extract header fields
-    external_id = next((item["text"] for item in data["texts"] if item.get("self_ref") == "#/texts/5"), None)
-    delivery_requested_at = next((item["text"] for item in data["texts"] if item.get("self_ref") == "#/texts/6"), None)
-    
-    ## Table 0
-    table_0_grid = data["tables"][0]["data"]["grid"]           
-    carplate = get_first_non_matching_value(table_0_grid[0], exclude_value="Matrícula / Bastidor:")
-    make = remove_substring_if_found("Marca:",get_first_non_matching_value(table_0_grid[1], exclude_value="Marca:"))
-    model = remove_substring_if_found("Modelo:",get_first_non_matching_value(table_0_grid[2], exclude_value="Modelo:"))
-    model = remove_substring_if_found(make, model)
-
-    # Table 1 (Origin)
-    table_1_grid = data["tables"][1]["data"]["grid"]
-    origin_address = Address(
-        address_name=get_first_non_matching_value(table_1_grid[0], "Punto de Recogida:"),
-        street=get_first_non_matching_value(table_1_grid[2], "Dirección:"),
-        city=None,  # Extract city if available
-        province=get_first_non_matching_value(table_1_grid[4], "Provincia:"),
-        postal_code=get_first_word(get_first_non_matching_value(table_1_grid[3], "Código Postal:")),
-    )
-    origin_contact = Contact(
-        contact_person=get_first_non_matching_value(table_1_grid[1], "Persona de Contacto:"),
-        phone=get_first_non_matching_value(table_1_grid[5], "Teléfono de Contacto:")
-    )
-    origin_comments=remove_substring_if_found("Observaciones:",get_first_non_matching_value(table_1_grid[6], "Observaciones:"))
-    
-    # Table 2 (Destination)
-    table_2_grid = data["tables"][2]["data"]["grid"]
-    destination_address = Address(
-        address_name=get_first_non_matching_value(table_2_grid[0], "Punto de Entrega:"),
-        street=get_first_non_matching_value(table_2_grid[2], "Dirección:"),
-        city=None,  
-        province=get_first_non_matching_value(table_2_grid[4], "Provincia:"),
-        postal_code=get_first_word(get_first_non_matching_value(table_2_grid[3], "Código Postal:")),
-    )
-    destination_contact = Contact(
-        contact_person=get_first_non_matching_value(table_2_grid[1], "Persona de Contacto:"),
-        phone=get_first_non_matching_value(table_2_grid[5], "Teléfono de Contacto:")
-    )
-    destination_comments=remove_substring_if_found("Observaciones:",get_first_non_matching_value(table_2_grid[6], "Observaciones:"))
-
-
-    # Vehicles
-    vehicles_origin = [Vehicle(
-        license_plate=carplate or "UNKNOWN",
-        make=make or "UNKNOWN",
-        model=model,
-        activity=ActivityEnum.Collection,  # Collection for first stop
-    )]
-
-    vehicles_destination = [Vehicle(
-        license_plate=carplate or "UNKNOWN",
-        make=make or "UNKNOWN",
-        model=model,
-        activity=ActivityEnum.Delivery,  # Delivery for second stop
-    )]
-
-    # Stops
-    stops = [
-        StopInfo(stop_number=1, address=origin_address, contact=origin_contact, vehicles=vehicles_origin, comments=origin_comments),
-        StopInfo(stop_number=2, address=destination_address, contact=destination_contact, vehicles=vehicles_destination, comments=destination_comments),
-    ]
-
-    # Header
-    header = Header(
-        company_name="SEMAT",
-        customer_code=None,
-        shipment_id=external_id or "UNKNOWN",
-        available_at=format_date(datetime.now().isoformat()),
-        delivery_requested_at=format_date(delivery_requested_at),
-        sender_email=None,
-        number_of_stops=len(stops),
-        number_of_vehicles=len(vehicles_origin),
-    )
-
-    return Order(header=header, stops=stops)
+    total = len(pending)
+    step = max(1, total // PROGRESS_UPDATES)
 
-def process_uploaded_pdfs(uploaded_files):
-    """Processes and extracts data from uploaded PDF files."""
-    new_orders = []
-    progress_bar = st.progress(0)
+    with st.status(f"🔍 Extracting data from {total} file(s)...", expanded=False) as status:
+        progress_bar = st.progress(0)
+        executor, futures = submit_to_worker_pool(worker, pending)
+        for done, _ in enumerate(as_completed(futures), start=1):
+            if done % step == 0 or done == total:
+                status.update(label=f"🔍 Extracted {done}/{total} file(s)...")
+                progress_bar.progress(done / total)  # Update progress bar
 
-    for idx, uploaded_file in enumerate(uploaded_files):
-        file_size = uploaded_file.size
-        if file_size > MAX_FILE_SIZE_BYTES:
-            st.error(f"File '{uploaded_file.name}' exceeds {MAX_FILE_SIZE_MB}MB and was skipped.")
-            continue
+        status.update(label=f"✅ Extracted {total} file(s)", state="complete")
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
-            temp_file.write(uploaded_file.read())
-            temp_pdf_path = temp_file.name
-
-        st.write(f"🔍 Extracting data from **{uploaded_file.name}**...")
-
-        try:
-            extracted_data = extract_text_from_file(temp_pdf_path)  # Assume function exists
-            if extracted_data:
-                new_order = build_order_model(extracted_data["dict"])  # Assume function exists
-                new_orders.append(new_order)
-        except ValidationError as e:
-            st.error(f"❌ Validation error in {uploaded_file.name}: {e}")
-        except Exception as e:
-            st.error(f"❌ Error processing {uploaded_file.name}: {str(e)}")
-
-        progress_bar.progress((idx + 1) / len(uploaded_files))  # Update progress bar
-
-    progress_bar.empty()  # Remove progress bar when done
-    return new_orders
-
-# Define CSS to fix missing content issues
-CSS_STYLES = """
-@page {
-    size: A3;
-    margin: 15mm;
-}
-
-/* Prevent elements from breaking across pages */
-.no-break {
-    page-break-inside: avoid;
-}
-
-/* Force new pages for important sections */
-.page-break {
-    page-break-before: always;
-}
-
-/* Ensure images and tables fit the page */
-img, table {
-    max-width: 100%;
-    height: auto;
-}
-
-/* Set body width to fit standard page */
-body {
-    width: 210mm;
-    height: auto;
-    margin: 10mm;
-}
-"""
+    results = [collect_result(future, args[1]) for future, args in zip(futures, pending)]
+    if any(isinstance(future.exception(), BrokenProcessPool) for future in futures):
+        # The pool is broken for good once a worker dies; replace it rather than failing every later upload
+        reset_executor(executor)
+    return results
 
+def filter_uploads_by_size(uploaded_files, errors):
+    """
+    Returns the uploads that are within the size limit.
 
-def process_uploaded_htmls(uploaded_files):
-    """Processes and extracts data from uploaded HTML files."""
-    new_orders = []
-    progress_bar = st.progress(0)
-
-    for idx, uploaded_file in enumerate(uploaded_files):
-        file_size = uploaded_file.size
-        if file_size > MAX_FILE_SIZE_BYTES:
-            st.error(f"File '{uploaded_file.name}' exceeds {MAX_FILE_SIZE_MB}MB and was skipped.")
+    :param uploaded_files: Files returned by st.file_uploader.
+    :param errors: List collecting the error messages of skipped files.
+    :return: List of the accepted uploaded files.
+    """
+    accepted = []
+    for uploaded_file in uploaded_files:
+        if uploaded_file.size > MAX_FILE_SIZE_BYTES:
+            errors.append(f"File '{uploaded_file.name}' exceeds {MAX_FILE_SIZE_MB}MB and was skipped.")
             continue
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".html") as temp_file:
-            temp_file.write(uploaded_file.read())
-            temp_html_path = temp_file.name
+        accepted.append(uploaded_file)
+    return accepted
 
-        st.write(f"🔍 Extracting data from **{uploaded_file.name}**...")
+@st.cache_resource
+def get_order_cache():
+    """
+    Returns the in-memory cache of extracted orders, keyed by the SHA-256 of the PDF and shared by all sessions.
 
-        try:
-            # extracted_data = extract_text_from_file(temp_html_path)
-            html_content = uploaded_file.getvalue().decode("utf-8")
-            # Convert HTML to a PDF
+    Each session runs in its own thread, so the cache comes with the lock that guards it.
+    """
+    return OrderedDict(), threading.Lock()
 
-            # Convert HTML to PDF using WeasyPrint
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_pdf:
-                HTML(string=html_content, base_url=".").write_pdf(temp_pdf.name, stylesheets=[CSS(string=CSS_STYLES)])
-                pdf_path = temp_pdf.name
+def lookup_order(digest):
+    """
+    Returns a copy of the cached order of a PDF, marking it as recently used, or None on a cache miss.
 
-            st.success("✅ PDF generated successfully!")
+    Cached orders are shared by all sessions, so each hit gets its own copy, re-stamped with today's date.
+    """
+    order_cache, lock = get_order_cache()
+    with lock:
+        order = order_cache.get(digest)
+        if order is not None:
+            order_cache.move_to_end(digest)
+    return copy_cached_order(order) if order is not None else None
+
+def remember_order(digest, order):
+    """Stores an extracted order in the cache, evicting the least recently used ones beyond ORDER_CACHE_MAX_ENTRIES."""
+    order_cache, lock = get_order_cache()
+    with lock:
+        order_cache[digest] = order
+        order_cache.move_to_end(digest)
+        while len(order_cache) > ORDER_CACHE_MAX_ENTRIES:
+            order_cache.popitem(last=False)
+
+def process_uploaded_pdfs(uploaded_files, known_digests):
+    """
+    Processes and extracts data from uploaded PDF files, one worker process per file.
 
-            # Allow user to download the PDF
-            with open(pdf_path, "rb") as f:
-                st.download_button(
-                    label="📄 Download PDF",
-                    data=f,
-                    file_name="converted.pdf",
-                    mime="application/pdf"
-                )
+    Files already in the session are skipped, since the uploader hands them back on
+    every rerun. PDFs whose content was extracted by any session are served from
+    the in-memory order cache, so re-uploads never reach the worker pool.
 
+    :param uploaded_files: Files returned by st.file_uploader.
+    :param known_digests: SHA-256 of the PDFs whose orders the session already holds.
+    :return: Dictionary mapping the SHA-256 of each newly extracted PDF to its Order, in upload order.
+    """
+    errors = []
+    batch_orders = {}
+
+    uploads = filter_uploads_by_size(uploaded_files, errors)
+    digests = [hashlib.sha256(uploaded_file.getvalue()).hexdigest() for uploaded_file in uploads]
+
+    pending = []
+    pending_digests = []
+    for uploaded_file, digest in zip(uploads, digests):
+        if digest in known_digests or digest in batch_orders or digest in pending_digests:
+            continue  # Already in the session, or a duplicate upload within this batch
+        order = lookup_order(digest)
+        if order is not None:
+            batch_orders[digest] = order
+        else:
+            pending.append((uploaded_file.getvalue(), uploaded_file.name, digest))
+            pending_digests.append(digest)
+
+    results = run_in_worker_pool(convert_pdf, pending)
+
+    for digest, result in zip(pending_digests, results):
+        if isinstance(result, ExtractionError):
+            errors.append(f"❌ {result}")
+        else:
+            batch_orders[digest] = result
+            remember_order(digest, result)
+
+    if errors:
+        st.error("\n\n".join(errors))
+    return {digest: batch_orders[digest] for digest in digests if digest in batch_orders}
 
-            converter = DocumentConverter()
-            result = converter.convert(pdf_path)
-            
-            extracted_data = {
-                "text": result.document.export_to_markdown(),
-                "dict": result.document.export_to_dict(),
-            }
-            if extracted_data:
-               # new_order = build_order_model(extracted_data["dict"])
-               # new_orders.append(new_order)
-               new_orders = extracted_data
 
-        except ValidationError as e:
-            st.error(f"❌ Validation error in {uploaded_file.name}: {e}")
-        except Exception as e:
-            st.error(f"❌ Error processing {uploaded_file.name}: {str(e)}")
+def process_uploaded_htmls(uploaded_files):
+    """
+    Processes and extracts data from uploaded HTML files, one worker process per file.
 
-        progress_bar.progress((idx + 1) / len(uploaded_files))  # Update progress bar
+    Results are kept in the session by HTML digest, so reruns (every widget click)
+    only send newly uploaded files to the worker pool instead of re-rendering the batch.
+    """
+    extracted_documents = []
+    errors = []
+    previous_results = st.session_state.html_results
+    html_results = {}  # Rebuilt from the current uploads, so removed files are dropped from the session
+
+    uploads = filter_uploads_by_size(uploaded_files, errors)
+    digests = [hashlib.sha256(uploaded_file.getvalue()).hexdigest() for uploaded_file in uploads]
+
+    pending = []
+    for uploaded_file, digest in zip(uploads, digests):
+        if digest in previous_results:
+            html_results[digest] = previous_results[digest]
+        elif digest not in html_results:
+            html_results[digest] = None  # Placeholder, so a duplicate upload is only converted once
+            pending.append((uploaded_file.getvalue(), uploaded_file.name, digest))
+
+    results = run_in_worker_pool(convert_html, pending)
+    for (_, _, digest), result in zip(pending, results):
+        html_results[digest] = result
+    st.session_state.html_results = html_results
+
+    converted = sum(not isinstance(result, ExtractionError) for result in results)
+    if converted:
+        st.success(f"✅ {converted} PDF(s) generated successfully!")
+
+    for idx, (uploaded_file, digest) in enumerate(zip(uploads, digests)):
+        extracted_data = html_results[digest]
+        if isinstance(extracted_data, ExtractionError):
+            errors.append(f"❌ {extracted_data}")
+            continue
+
+        # Allow user to download the PDF; keyed by position since several uploads can share a name
+        file_name = uploaded_file.name
+        st.download_button(
+            label=f"📄 Download {file_name} as PDF",
+            data=extracted_data["pdf_bytes"],
+            file_name=os.path.splitext(file_name)[0] + ".pdf",
+            mime="application/pdf",
+            key=f"download_{idx}"
+        )
 
-    progress_bar.empty()  # Remove progress bar when done
-    return new_orders
+        # new_order = build_order_model(extracted_data["document"])
+        extracted_documents.append({**extracted_data, "file_name": file_name})
+
+    if errors:
+        st.error("\n\n".join(dict.fromkeys(errors)))  # A duplicate upload reports its error once
+    return extracted_documents
+
+def dumps_json(data):
+    """Serializes data to indented JSON, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(data, indent=2, ensure_ascii=False)
+
+@st.cache_data(show_spinner=False)
+def dumps_tables_json(digest, _document):
+    """Serializes the Docling tables of an HTML file, cached by the file's digest so reruns skip the work."""
+    # Dump only the tables, the same way export_to_dict() would, instead of the whole document
+    tables = [table.model_dump(mode="json", by_alias=True, exclude_none=True) for table in _document.tables]
+    return dumps_json(tables)
+
+@st.cache_data(show_spinner=False)
+def export_markdown(digest, _document):
+    """Exports an HTML file's DoclingDocument to markdown, cached by the file's digest."""
+    return _document.export_to_markdown()
+
+def get_formatted_orders_json():
+    """Returns the extracted orders as JSON, serializing them only after they changed instead of on every rerun."""
+    if st.session_state.formatted_json is None:
+        # Orders were validated when they were built, so skip re-validating them here
+        order_list = OrderList.model_construct(orders=st.session_state.extracted_orders)
+        st.session_state.formatted_json = order_list.model_dump_json(indent=4)
+    return st.session_state.formatted_json
 
 def display_extracted_orders():
     """Displays extracted orders with a PDF viewer on the left and JSON on the right."""
@@ -342,46 +306,24 @@ def display_extracted_orders():
 
         with col2:
             st.subheader("📂 JSON Viewer")
-            order_list = OrderList(orders=st.session_state.extracted_orders)
-            formatted_json = order_list.model_dump_json(indent=4)
-            st_ace(formatted_json, language="json", theme="monokai", key=st.session_state.json_viewer_key)
+            formatted_json = get_formatted_orders_json()
+            # Read-only viewer: st.json renders a lazy, collapsible tree instead of a full Ace editor
+            st.json(formatted_json, expanded=False)
+            st.download_button(
+                label="💾 Download JSON",
+                data=formatted_json,
+                file_name="orders.json",
+                mime="application/json"
+            )
 
         # Clear orders button
         if st.button("🗑️ Clear Extracted Orders"):
             st.session_state.extracted_orders = []
-            st.session_state.json_viewer_key = f"json_viewer_{st.session_state.json_viewer_key[-1:]}"  # Update widget key
+            st.session_state.extracted_digests = set()
+            st.session_state.formatted_json = None
             st.rerun()  # Refresh UI
 
 
-def display_extracted_html_orders():
-    """Displays extracted orders with an HTML viewer on the left and JSON on the right."""
-    if st.session_state.extracted_orders:
-        st.subheader("📋 Extracted Order Data")
-
-        # Create a side-by-side layout
-        col1, col2 = st.columns([1, 1])
-
-        with col1:
-            st.subheader("📄 Uploaded HTMLs")
-            if "uploaded_files" in st.session_state:
-                for uploaded_file in st.session_state.uploaded_files:
-                    binary_data = uploaded_file.getvalue()                    
-
-        with col2:
-            st.subheader("📂 JSON Viewer")
-            #order_list = OrderList(orders=st.session_state.extracted_orders)
-            #formatted_json = order_list.model_dump_json(indent=4)
-            formatted_json = st.session_state.extracted_orders["tables"]
-
-            st_ace(formatted_json, language="json", theme="monokai", key=st.session_state.json_viewer_key)
-
-        # Clear orders button
-        if st.button("🗑️ Clear Extracted Orders"):
-            st.session_state.extracted_orders = []
-            st.session_state.json_viewer_key = f"json_viewer_{st.session_state.json_viewer_key[-1:]}"  # Update widget key
-            st.rerun()  # Refresh UI            
-
-
 def main():
 
     # Sidebar navigation
@@ -399,10 +341,12 @@ def main():
         )
 
         if uploaded_files:
-            new_orders = process_uploaded_pdfs(uploaded_files)
-            
+            new_orders = process_uploaded_pdfs(uploaded_files, st.session_state.extracted_digests)
+
             if new_orders:
-                st.session_state.extracted_orders.extend(new_orders)
+                st.session_state.extracted_digests.update(new_orders)
+                st.session_state.extracted_orders.extend(new_orders.values())
+                st.session_state.formatted_json = None
                 st.success(f"✅ Successfully extracted {len(new_orders)} new orders!")
 
         display_extracted_orders()
@@ -419,19 +363,22 @@ def main():
         )
 
         if uploaded_files:
-            extracted_data = process_uploaded_htmls(uploaded_files)
-
-            # Display extracted data
-            st.success("Extraction Complete!")
-            st.subheader("Extracted JSON Data")
-
-            data=extracted_data['dict']
-            text=extracted_data['text']
-            st.markdown(text)
-
-
-            json_data = json.dumps(extracted_data['dict']['tables'], indent=4)
-            st_ace(json_data, language="json", theme="monokai", key="json_viewer")
+            extracted_documents = process_uploaded_htmls(uploaded_files)
+
+            if extracted_documents:
+                # Display extracted data
+                st.success("Extraction Complete!")
+                st.subheader("Extracted JSON Data")
+
+                for idx, extracted_data in enumerate(extracted_documents):
+                    st.markdown(f"#### {extracted_data['file_name']}")
+                    # The markdown export walks the whole document, so only build it when asked for
+                    if st.toggle("Show markdown", key=f"markdown_{idx}"):
+                        st.markdown(export_markdown(extracted_data['digest'], extracted_data['document']))
+
+                    with st.expander("Show raw JSON", expanded=False):
+                        json_data = dumps_tables_json(extracted_data['digest'], extracted_data['document'])
+                        st_ace(json_data, language="json", theme="monokai", key=f"json_viewer_{idx}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
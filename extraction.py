@@ -0,0 +1,384 @@
+import io
+import os
+import sys
+import stat
+import pickle
+import hashlib
+import pathlib
+import tempfile
+import functools
+from datetime import datetime
+from pydantic import ValidationError
+
+# Import the Pydantic models
+from models import Order, ActivityEnum
+
+# Import the string/date helpers
+from helpers import (
+    DATE_FORMAT,
+    get_labelled_row_values,
+    get_first_word,
+    remove_substring_if_found,
+    format_date,
+)
+
+# Row labels of the vehicle and stop tables
+LABEL_PLATE = sys.intern("Matrícula / Bastidor:")
+LABEL_MAKE = sys.intern("Marca:")
+LABEL_MODEL = sys.intern("Modelo:")
+LABEL_PICKUP_POINT = sys.intern("Punto de Recogida:")
+LABEL_DELIVERY_POINT = sys.intern("Punto de Entrega:")
+LABEL_CONTACT_PERSON = sys.intern("Persona de Contacto:")
+LABEL_STREET = sys.intern("Dirección:")
+LABEL_POSTAL_CODE = sys.intern("Código Postal:")
+LABEL_PROVINCE = sys.intern("Provincia:")
+LABEL_PHONE = sys.intern("Teléfono de Contacto:")
+LABEL_COMMENTS = sys.intern("Observaciones:")
+
+# The vehicle table lists its rows in this order
+VEHICLE_LABELS = (LABEL_PLATE, LABEL_MAKE, LABEL_MODEL)
+
+# Stop tables list their rows in this order; only the first label differs
+ORIGIN_LABELS = (LABEL_PICKUP_POINT, LABEL_CONTACT_PERSON, LABEL_STREET, LABEL_POSTAL_CODE, LABEL_PROVINCE, LABEL_PHONE, LABEL_COMMENTS)
+DESTINATION_LABELS = (LABEL_DELIVERY_POINT,) + ORIGIN_LABELS[1:]
+
+# On-disk cache of Docling conversions; bump CACHE_VERSION when Docling or the export format changes.
+# Entries are pickles, so the directory is per user and must not be writable by anyone else.
+CACHE_DIR = pathlib.Path(tempfile.gettempdir()) / (f"docling_cache-{os.getuid()}" if hasattr(os, "getuid") else "docling_cache")
+CACHE_VERSION = 3
+CACHE_MAX_ENTRIES = 256
+
+# Threads granted to Docling's BLAS/onnxruntime pools inside each worker process
+WORKER_OMP_NUM_THREADS = "2"
+
+
+class ExtractionError(Exception):
+    """Picklable error returned by worker processes when a file cannot be converted."""
+
+
+# Define CSS to fix missing content issues
+CSS_STYLES = """
+@page {
+    size: A3;
+    margin: 15mm;
+}
+
+/* Prevent elements from breaking across pages */
+.no-break {
+    page-break-inside: avoid;
+}
+
+/* Force new pages for important sections */
+.page-break {
+    page-break-before: always;
+}
+
+/* Ensure images and tables fit the page */
+img, table {
+    max-width: 100%;
+    height: auto;
+}
+
+/* Set body width to fit standard page */
+body {
+    width: 210mm;
+    height: auto;
+    margin: 10mm;
+}
+"""
+
+
+def ensure_cache_dir():
+    """
+    Creates the cache directory, private to the current user, and checks that pickles can be trusted from it.
+
+    :return: True if CACHE_DIR is a real directory owned by the current user and closed to everyone else.
+    """
+    try:
+        CACHE_DIR.mkdir(mode=0o700, exist_ok=True)
+        info = CACHE_DIR.lstat()
+    except OSError:
+        return False
+
+    if not stat.S_ISDIR(info.st_mode):
+        return False  # e.g. a symlink planted by another user
+    if hasattr(os, "getuid") and (info.st_uid != os.getuid() or info.st_mode & 0o077):
+        return False  # Created, or left writable, by someone else
+    return True
+
+def load_cached_extraction(key):
+    """
+    Loads a converted DoclingDocument from the on-disk cache.
+
+    :param key: Content hash of the converted file.
+    :return: The cached document, or None on a cache miss.
+    """
+    if not ensure_cache_dir():
+        return None
+
+    cache_path = CACHE_DIR / f"v{CACHE_VERSION}-{key}.pkl"
+    try:
+        with cache_path.open("rb") as f:
+            document = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        try:
+            cache_path.unlink(missing_ok=True)  # Corrupted or incompatible entry
+        except OSError:
+            pass
+        return None
+
+    try:
+        os.utime(cache_path)  # Mark the entry as recently used for LRU eviction
+    except OSError:
+        pass  # Already evicted by another worker
+    return document
+
+def store_cached_extraction(key, document):
+    """
+    Stores a converted DoclingDocument in the on-disk cache, evicting the least recently used entries.
+
+    Caching is best-effort: a full disk or an unusable cache directory never fails the conversion.
+
+    :param key: Content hash of the converted file.
+    :param document: DoclingDocument returned by the conversion.
+    """
+    if not ensure_cache_dir():
+        return
+
+    cache_path = CACHE_DIR / f"v{CACHE_VERSION}-{key}.pkl"
+    temp_path = None
+    try:
+        # Write to a temp file first so concurrent workers never read a partial entry
+        with tempfile.NamedTemporaryFile(dir=CACHE_DIR, suffix=".tmp", delete=False) as temp_file:
+            temp_path = temp_file.name
+            pickle.dump(document, temp_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
+        temp_path = None
+    except OSError:
+        return
+    finally:
+        if temp_path is not None:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+
+    evict_cached_extractions()
+
+def evict_cached_extractions():
+    """Deletes the least recently used cache entries beyond CACHE_MAX_ENTRIES, skipping ones other workers removed."""
+    entries = []
+    try:
+        for entry in CACHE_DIR.glob("*.pkl"):
+            try:
+                entries.append((entry.stat().st_atime, entry))
+            except FileNotFoundError:
+                continue  # Evicted by another worker since the glob
+    except OSError:
+        return
+
+    entries.sort()
+    for _, entry in entries[:-CACHE_MAX_ENTRIES]:
+        try:
+            entry.unlink(missing_ok=True)
+        except OSError:
+            pass
+
+def extract_document(pdf_bytes, file_name, cache_key=None):
+    """
+    Converts an in-memory PDF using Docling's DocumentConverter and returns its DoclingDocument.
+
+    The bytes are handed to Docling as a DocumentStream, so no temporary file is written.
+    Documents are cached on disk by content hash, so re-uploading a file skips Docling entirely.
+
+    :param pdf_bytes: Content of the PDF file.
+    :param file_name: Name of the file, used by Docling to detect the format.
+    :param cache_key: Cache key to use instead of the SHA-256 of pdf_bytes.
+    :return: The converted DoclingDocument.
+    """
+    from docling.datamodel.base_models import DocumentStream
+
+    key = cache_key or hashlib.sha256(pdf_bytes).hexdigest()
+    document = load_cached_extraction(key)
+    if document is not None:
+        return document
+
+    converter = get_converter()
+    stream = DocumentStream(name=file_name, stream=io.BytesIO(pdf_bytes))
+    document = converter.convert(stream).document
+    store_cached_extraction(key, document)
+    return document
+
+def grid_texts(table):
+    """Returns the texts of a Docling table grid, row by row."""
+    return [[cell.text for cell in row] for row in table.data.grid]
+
+def build_stop(stop_number, grid, labels, vehicles):
+    """
+    Builds the payload of a StopInfo from a stop table grid whose rows follow the given labels.
+
+    :param stop_number: Position of the stop in the order.
+    :param grid: Cell texts of the stop table, as returned by grid_texts.
+    :param labels: Row labels of the grid, e.g. ORIGIN_LABELS or DESTINATION_LABELS.
+    :param vehicles: Payloads of the vehicles handled at this stop.
+    :return: Dictionary matching the StopInfo model.
+    """
+    address_name, contact_person, street, postal_code, province, phone, comments = get_labelled_row_values(grid, labels)
+    return {
+        "stop_number": stop_number,
+        "address": {
+            "address_name": address_name,
+            "street": street,
+            "city": None,  # Extract city if available
+            "province": province,
+            "postal_code": get_first_word(postal_code),
+        },
+        "contact": {"contact_person": contact_person, "phone": phone},
+        "vehicles": vehicles,
+        "comments": remove_substring_if_found(LABEL_COMMENTS, comments),
+    }
+
+def build_order_model(document):
+    """
+    Builds a structured Order object from a converted PDF DoclingDocument.
+
+    Only the few texts and tables that hold order fields are read, straight
+    from the document, instead of exporting the whole document to a dict first.
+
+    The whole order is assembled as a plain dict and validated in a single
+    Order.model_validate call rather than one constructor call per nested model.
+    """
+    
+    # Extract header fields
+    texts = document.texts
+    external_id = texts[5].text if len(texts) > 5 else None
+    delivery_requested_at = texts[6].text if len(texts) > 6 else None
+    
+    ## Table 0
+    table_0_grid = grid_texts(document.tables[0])
+    carplate, make, model = get_labelled_row_values(table_0_grid, VEHICLE_LABELS)
+    make = remove_substring_if_found(LABEL_MAKE, make)
+    model = remove_substring_if_found(LABEL_MODEL, model)
+    model = remove_substring_if_found(make, model)
+
+    # Vehicles
+    vehicle = {
+        "license_plate": carplate or "UNKNOWN",
+        "make": make or "UNKNOWN",
+        "model": model,
+    }
+    vehicles_origin = [{**vehicle, "activity": ActivityEnum.Collection}]  # Collection for first stop
+    vehicles_destination = [{**vehicle, "activity": ActivityEnum.Delivery}]  # Delivery for second stop
+
+    # Stops: table 1 is the origin, table 2 the destination
+    stops = [
+        build_stop(1, grid_texts(document.tables[1]), ORIGIN_LABELS, vehicles_origin),
+        build_stop(2, grid_texts(document.tables[2]), DESTINATION_LABELS, vehicles_destination),
+    ]
+
+    # Header
+    header = {
+        "company_name": "SEMAT",
+        "customer_code": None,
+        "shipment_id": external_id or "UNKNOWN",
+        "available_at": datetime.now().strftime(DATE_FORMAT),
+        "delivery_requested_at": format_date(delivery_requested_at),
+        "sender_email": None,
+        "number_of_stops": len(stops),
+        "number_of_vehicles": len(vehicles_origin),
+    }
+
+    return Order.model_validate({"header": header, "stops": stops})
+
+def copy_cached_order(order):
+    """
+    Returns a private deep copy of a cached Order, dated today as if it had just been extracted.
+
+    available_at is the date of the extraction rather than a field of the PDF, so an order served
+    from a long-lived cache must not keep the date of its first extraction.
+    """
+    order = order.model_copy(deep=True)
+    order.header.available_at = datetime.now().strftime(DATE_FORMAT)
+    return order
+
+
+def html_to_pdf(html_bytes):
+    """Renders HTML content to PDF in memory using WeasyPrint and returns the PDF bytes."""
+    from weasyprint import HTML, CSS  # Imported lazily, like Docling, to keep app start-up fast
+
+    html_content = html_bytes.decode("utf-8")
+    return HTML(string=html_content, base_url=".").write_pdf(stylesheets=[CSS(string=CSS_STYLES)])
+
+
+@functools.lru_cache()
+def get_converter():
+    """
+    Returns the DocumentConverter of the current process, loading Docling's models only once.
+
+    PDFs are parsed with the pypdfium backend, which is about twice as fast as
+    Docling's default backend and needs less than half of its memory.
+
+    The orders (and the PDFs rendered from HTML) are native-text PDFs, so OCR is
+    disabled. Table cell matching is disabled too: rows are read by position and
+    label, so the model's own cell texts are enough.
+
+    Docling (and torch/onnxruntime behind it) is imported here rather than at
+    module level, so the Streamlit UI renders before the first conversion pays that cost.
+    """
+    from docling.backend.pypdfium2_backend import PyPdfiumDocumentBackend
+    from docling.datamodel.base_models import InputFormat
+    from docling.datamodel.pipeline_options import PdfPipelineOptions
+    from docling.document_converter import DocumentConverter, PdfFormatOption
+
+    pipeline_options = PdfPipelineOptions(do_ocr=False, do_table_structure=True)
+    pipeline_options.table_structure_options.do_cell_matching = False
+    pdf_format_option = PdfFormatOption(pipeline_options=pipeline_options, backend=PyPdfiumDocumentBackend)
+    return DocumentConverter(format_options={InputFormat.PDF: pdf_format_option})
+
+
+def init_worker():
+    """Process pool initializer: caps Docling's internal threads so workers don't oversubscribe the CPU."""
+    os.environ["OMP_NUM_THREADS"] = WORKER_OMP_NUM_THREADS
+
+
+def convert_pdf(pdf_bytes, file_name, digest=None):
+    """
+    Worker entry point: extracts a single PDF file and builds its Order.
+
+    :param pdf_bytes: Content of the uploaded PDF file.
+    :param file_name: Original name of the uploaded file, used in error messages.
+    :param digest: SHA-256 of pdf_bytes when the caller already computed it.
+    :return: The extracted Order, or an ExtractionError if the file could not be processed.
+    """
+    try:
+        document = extract_document(pdf_bytes, file_name, cache_key=digest)
+        return build_order_model(document)
+    except ValidationError as e:
+        return ExtractionError(f"Validation error in {file_name}: {e}")
+    except Exception as e:
+        return ExtractionError(f"Error processing {file_name}: {str(e)}")
+
+
+def convert_html(html_bytes, file_name, digest=None):
+    """
+    Worker entry point: renders a single HTML file to PDF and converts it with Docling.
+
+    Exports (markdown, tables dict) are left to the caller, which only builds the ones it displays.
+
+    :param html_bytes: Content of the uploaded HTML file.
+    :param file_name: Original name of the uploaded file, used in error messages.
+    :param digest: SHA-256 of html_bytes when the caller already computed it.
+    :return: Dictionary with the DoclingDocument "document", the generated "pdf_bytes" and the HTML "digest",
+        or an ExtractionError.
+    """
+    try:
+        digest = digest or hashlib.sha256(html_bytes).hexdigest()
+        pdf_bytes = html_to_pdf(html_bytes)
+        # Rendered PDFs embed a creation date, so cache by the HTML content instead
+        pdf_name = os.path.splitext(file_name)[0] + ".pdf"
+        document = extract_document(pdf_bytes, pdf_name, cache_key=digest)
+        return {"document": document, "pdf_bytes": pdf_bytes, "digest": digest}
+    except Exception as e:
+        return ExtractionError(f"Error processing {file_name}: {str(e)}")
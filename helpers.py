@@ -0,0 +1,101 @@
+import re
+import functools
+from itertools import islice
+from dateutil.parser import parse
+
+DATE_FORMAT = "%d/%m/%Y"
+
+# Postal Code Format: Typically 5-digit numbers (can be extended for other formats)
+POSTAL_CODE_RE = re.compile(r"\d{4,5}")
+
+
+def get_labelled_row_values(grid: list[list[str]], labels: tuple[str, ...]) -> list[str | None]:
+    """
+    Returns the value of each labelled row of a table grid in a single pass.
+
+    :param grid: Cell texts of the table, row by row.
+    :param labels: Label of each row, in grid order.
+    :return: For each row, the first non-blank cell text other than its label, or None.
+    """
+    # Compare against the label first: it is the common case and cheaper than strip()
+    return [
+        next((value for value in row if value and value != label and value.strip()), None)
+        for row, label in zip(grid, labels)
+    ]
+
+def get_first_word(text: str | None) -> str:
+    """
+    Extracts the first word from a given text safely and ensures it has a valid postal code format.
+
+    :param text: The input string.
+    :return: The first word if it looks like a postal code; otherwise, the original text.
+    """
+    if not isinstance(text, str) or not text.strip():
+        return ""  # Return empty string if text is None, empty, or not a string
+
+    first_word = text.split(None, 1)[0]
+
+    if POSTAL_CODE_RE.fullmatch(first_word):
+        return first_word
+
+    return text  # Return original input if first word is not a postal code
+
+@functools.lru_cache(maxsize=256)
+def casefold_label(label: str) -> str:
+    """Returns the stripped, casefolded form of a label; cached since the same labels repeat for every order."""
+    return label.strip().casefold()
+
+def remove_substring_if_found(substring: str | None, main_string: str | None) -> str:
+    """
+    Removes the given substring from the start of the main string, case-insensitively.
+
+    :param substring: The string to check and remove (can be None).
+    :param main_string: The string from which the substring should be removed (can be None).
+    :return: The modified main string with the substring removed if found.
+    """
+    # Handle None values by converting them to empty strings
+    if substring is None:
+        substring = ""
+    if main_string is None:
+        return ""
+
+    main_string = main_string.strip()
+    substring = substring.strip()
+    # Slice by the original length: casefold() can change it (e.g. "ß" -> "ss")
+    length = len(substring)
+
+    # Only the prefix is folded, not the whole (possibly long) main string
+    if main_string[:length].casefold() == casefold_label(substring):
+        return main_string[length:].lstrip()  # Use lstrip() to remove leftover leading spaces
+
+    return main_string
+
+def concatenate_text_from_index(objects_list: list[dict], start_index: int = 11) -> str:
+    """
+    Concatenates the 'text' values from a list of objects starting from a given index.
+
+    :param objects_list: List of dictionaries containing a "text" key.
+    :param start_index: Index from which to start concatenation.
+    :return: Concatenated string of 'text' values.
+    """
+    parts: list[str] = []
+    append = parts.append  # Local binding avoids the attribute lookup on every item
+    for obj in islice(objects_list, start_index, None):
+        text = obj.get("text")
+        if text and text.strip():
+            append(text)
+    return "\n".join(parts)
+
+@functools.lru_cache(maxsize=1024)
+def _parse_date_cached(value: str) -> str:
+    """Parses a date string with dateutil and formats it as 'DD/MM/YYYY'; cached since dates repeat across a batch."""
+    return parse(value).strftime(DATE_FORMAT)
+
+def format_date(value: str | None) -> str | None:
+    """Formats dates into 'DD/MM/YYYY' format."""
+    if value:
+        try:
+            return _parse_date_cached(value)
+        except (ValueError, TypeError):
+            return value
+    return value
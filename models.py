@@ -1,9 +1,17 @@
-from pydantic import BaseModel, ValidationError, Field
+from pydantic import BaseModel, ValidationError, Field, ConfigDict
+from pydantic.dataclasses import dataclass
 from enum import Enum
 from typing import Optional, List
 
-# Pydantic models for data validation
-class Address(BaseModel):
+# Shared config: nested models that are already validated are reused as-is, never re-validated or copied,
+# and assignments are not re-validated either
+MODEL_CONFIG = ConfigDict(validate_assignment=False, revalidate_instances="never", extra="ignore")
+
+# Pydantic models for data validation.
+# The leaf models (one instance per stop/vehicle) are slotted, frozen pydantic dataclasses: no per-instance
+# __dict__, and they are still validated and serialized through the Order/OrderList models that hold them
+@dataclass(config=MODEL_CONFIG, slots=True, frozen=True, kw_only=True)
+class Address:
     address_name: Optional[str] = Field(
         None,
         title="Name of the address",
@@ -15,7 +23,8 @@ class Address(BaseModel):
     postal_code: str
 
 
-class Contact(BaseModel):
+@dataclass(config=MODEL_CONFIG, slots=True, frozen=True, kw_only=True)
+class Contact:
     contact_person: Optional[str] = None
     phone: Optional[str] = None
 
@@ -37,7 +46,8 @@ class ColorEnum(str, Enum):
     Brown = "Brown"
 
 
-class Vehicle(BaseModel):
+@dataclass(config=MODEL_CONFIG, slots=True, frozen=True, kw_only=True)
+class Vehicle:
     license_plate: str
     vin: Optional[str] = Field(
         None,
@@ -67,6 +77,8 @@ class Vehicle(BaseModel):
     activity: Optional[ActivityEnum] = None
 
 class StopInfo(BaseModel):
+    model_config = MODEL_CONFIG
+
     stop_number: int
     address: Address
     contact: Optional[Contact] = None
@@ -74,6 +86,8 @@ class StopInfo(BaseModel):
     comments: Optional[str] = None
 
 class Header(BaseModel):
+    model_config = MODEL_CONFIG
+
     company_name: Optional[str] = None
     customer_code: Optional[str] = Field(
         None,
@@ -99,9 +113,13 @@ class Header(BaseModel):
     number_of_vehicles: int
 
 class Order(BaseModel):
+    model_config = MODEL_CONFIG
+
     header: Header
     stops: List[StopInfo]
 
 
 class OrderList(BaseModel):
+    model_config = MODEL_CONFIG
+
     orders: List[Order]
\ No newline at end of file